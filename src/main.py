@@ -1,13 +1,31 @@
-import sqlite3
+try:
+    # Newer SQLite build with more optimizer features, if installed (pip install pysqlite3-binary)
+    from pysqlite3 import dbapi2 as sqlite3
+except ImportError:
+    import sqlite3
+import sys
 import datetime
 import time
+import random
 import re
 import os
-import shutil
+import functools
+import json
+import contextlib
+import atexit
+import threading
+import queue
+from pathlib import Path
 from collections import defaultdict
 
+try:
+    import readline  # Line editing and scan history where available (not on Windows)
+except ImportError:
+    readline = None
+
 # Local data storage
 DB_NAME = "item_tracking.db"
+HISTORY_FILE = ".item_tracking_history"
 
 # Item Type Translation (initial values)
 INITIAL_ITEM_CODES = {
@@ -35,306 +53,541 @@ def backup_database():
     backup_path = os.path.join(backup_dir, backup_name)
     
     try:
-        shutil.copyfile(DB_NAME, backup_path)
-        print(f"Database backed up to: {backup_path}")
+        # Skip the copy if nothing was written since the newest backup (an empty WAL holds no changes)
+        written = [os.path.getmtime(path) for path in (DB_NAME, DB_NAME + "-wal")
+                   if os.path.exists(path) and os.path.getsize(path) > 0]
+        last_backup = max((entry.stat().st_mtime for entry in os.scandir(backup_dir)
+                           if entry.name.endswith(".db")), default=0)
+        if written and max(written) <= last_backup:
+            print("Database unchanged since last backup, skipping backup.")
+            return
+        
+        # Online backup API: consistent snapshot including the WAL, no torn reads
+        # Written under a temp name first, so a failed copy never looks like the newest backup
+        pages = []
+        temp_path = backup_path + ".tmp"
+        backup_conn = sqlite3.connect(temp_path)
+        try:
+            # Copy in steps so writers are not held off
+            get_conn().backup(backup_conn, pages=1000,
+                              progress=lambda status, remaining, total: pages.append(total))
+        finally:
+            backup_conn.close()
+        os.replace(temp_path, backup_path)
+        print(f"Database backed up to: {backup_path} ({pages[-1] if pages else 0} pages)")
     except Exception as e:
+        if os.path.exists(backup_path + ".tmp"):
+            os.remove(backup_path + ".tmp")
         print(f"Backup failed: {e}")
 
+def setup_history():
+    """Load input history (up-arrow recalls earlier scans) and save it on exit"""
+    if readline is None:
+        return
+    # Keep TAB literal for bulk location entry
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I ed-insert")
+    else:
+        readline.parse_and_bind("tab: tab-insert")
+    readline.set_history_length(1000)
+    try:
+        readline.read_history_file(HISTORY_FILE)
+    except OSError:
+        pass  # No history yet
+    atexit.register(readline.write_history_file, HISTORY_FILE)
+
 # ===== TASK 3: VALIDATION FUNCTIONS =====
 def is_alphanumeric(input_str):
     """Check if input is alphanumeric"""
     return input_str.isalnum()
 
+_NON_ALNUM_RE = re.compile(r'[\W_]+')
+
 def to_upper_alphanumeric(input_str):
     """Convert to uppercase and remove non-alphanumeric characters"""
-    return ''.join(filter(str.isalnum, input_str)).upper()
+    return _NON_ALNUM_RE.sub('', input_str).upper()
+
+# Barcode layout: 5 parts = batch, 6 parts = item (last group is the item suffix)
+_BARCODE_RE = re.compile(r'([^_]*)_([^_]*)_([^_]*)_([^_]*)_([^_]*)(?:_([^_]*))?')
 
 # Helper function to detect item barcodes
 def looks_like_item_barcode(barcode):
     """Check if barcode matches item format (XXXX_DD_MM_YY_GX_XXXX)"""
-    if not barcode:
-        return False
-    parts = barcode.split('_')
-    return len(parts) in (5, 6)  # 5 parts = batch, 6 parts = item
+    return bool(barcode) and barcode.count('_') in (4, 5)  # 5 parts = batch, 6 parts = item
+
+def _item_number_from_suffix(suffix):
+    """Convert an item suffix to its number, None if missing or not numeric"""
+    if suffix and suffix.isdigit():
+        try:
+            return int(suffix)
+        except ValueError:
+            return None
+    return None
+
+def get_item_number(barcode):
+    """Get numeric item suffix (last XXXX part) of an item barcode, or None"""
+    match = _BARCODE_RE.fullmatch(barcode)
+    return _item_number_from_suffix(match.group(6)) if match else None
+
+# Shared connection, opened once and reused for the whole session
+_CONN = None
+
+def get_conn():
+    """Return the shared database connection, opening it on first use"""
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect(DB_NAME, check_same_thread=False,
+                                cached_statements=512,  # Reuse prepared statements across loops
+                                isolation_level=None)  # Transactions are opened explicitly
+        _CONN.execute("PRAGMA busy_timeout = 15000;")  # Let SQLite wait for locks itself
+        _CONN.execute("PRAGMA page_size = 8192;")  # Only takes effect when the file is first created
+        _CONN.execute("PRAGMA journal_mode=WAL;")  # Enable Write-Ahead Logging
+        _CONN.execute("PRAGMA foreign_keys = ON;")  # Enable foreign key constraints
+        _CONN.execute("PRAGMA synchronous = NORMAL;")  # One fsync per checkpoint, safe with WAL
+        _CONN.execute("PRAGMA temp_store = MEMORY;")  # Keep report sorts in RAM
+        _CONN.execute("PRAGMA cache_size = -64000;")  # ~64 MB page cache
+        _CONN.execute("PRAGMA mmap_size = 268435456;")  # Memory-map up to 256 MB
+        _CONN.execute("PRAGMA wal_autocheckpoint = 1000;")
+        atexit.register(close_conn)
+    return _CONN
+
+# Read-only connection for reports and lookups, so reads never touch the write lock
+_READ_CONN = None
+
+def get_read_conn():
+    """Return the shared read-only connection, opening it on first use"""
+    global _READ_CONN
+    if _READ_CONN is None:
+        get_conn()  # Make sure the database and its WAL exist first
+        _READ_CONN = sqlite3.connect(Path(DB_NAME).absolute().as_uri() + "?mode=ro", uri=True,
+                                     check_same_thread=False, isolation_level=None,
+                                     cached_statements=512)  # Lookups and report variants stay prepared
+        _READ_CONN.execute("PRAGMA busy_timeout = 15000;")
+        _READ_CONN.execute("PRAGMA query_only = 1;")  # Refuse writes even if one slips through
+        _READ_CONN.execute("PRAGMA temp_store = MEMORY;")  # Keep report sorts in RAM
+        _READ_CONN.execute("PRAGMA mmap_size = 268435456;")  # Memory-map up to 256 MB
+    return _READ_CONN
+
+def close_conn():
+    """Refresh stale planner statistics and close the shared connections"""
+    global _CONN, _READ_CONN
+    stop_writer()
+    stop_checkpointer()
+    if _READ_CONN is not None:
+        _READ_CONN.close()
+        _READ_CONN = None
+    if _CONN is not None:
+        try:
+            _CONN.execute("PRAGMA optimize;")
+        except sqlite3.Error:
+            pass
+        _CONN.close()
+        _CONN = None
+
+# Background WAL checkpointing, so commits on the main thread never pay for it
+CHECKPOINT_INTERVAL = 30  # seconds
+_CHECKPOINTER = None
+_CHECKPOINT_STOP = threading.Event()
+
+def _checkpoint_loop():
+    """Periodically copy the WAL back into the database on a dedicated connection"""
+    conn = sqlite3.connect(DB_NAME, timeout=15)
+    try:
+        while not _CHECKPOINT_STOP.wait(CHECKPOINT_INTERVAL):
+            try:
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE);")  # Never blocks readers or writers
+            except sqlite3.Error:
+                pass
+    finally:
+        conn.close()
+
+def start_checkpointer():
+    """Move WAL checkpoints off the main connection onto a background thread"""
+    global _CHECKPOINTER
+    if _CHECKPOINTER is None:
+        get_conn().execute("PRAGMA wal_autocheckpoint = 0;")  # The thread checkpoints instead
+        _CHECKPOINT_STOP.clear()
+        _CHECKPOINTER = threading.Thread(target=_checkpoint_loop, name="wal-checkpoint", daemon=True)
+        _CHECKPOINTER.start()
+
+def stop_checkpointer():
+    """Stop the background checkpoint thread and wait for it to close its connection"""
+    global _CHECKPOINTER
+    if _CHECKPOINTER is not None:
+        _CHECKPOINT_STOP.set()
+        _CHECKPOINTER.join()
+        _CHECKPOINTER = None
+
+# Background writer for scans, so the prompt comes back while a scan commits
+WRITE_QUEUE_SIZE = 64  # Scans the UI may get ahead of the writer before put() waits
+WRITE_IDLE_WAIT = 0.1  # Seconds the writer waits for more scans to add to the same transaction
+_WRITER = None
+_WRITE_QUEUE = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+_WRITE_RESULTS = queue.Queue()  # (rows, result, error) per batch, printed by the UI thread
+
+def _run_write_job(flush, rows, args):
+    """Flush one batch of rows and queue its result, or the error if it was not saved"""
+    try:
+        _WRITE_RESULTS.put((rows, flush(get_conn(), rows, *args), None))
+    except Exception as e:
+        _WRITE_RESULTS.put((rows, None, e))
+
+def _writer_loop():
+    """Write queued scans on the shared write connection, grouping those that arrive together"""
+    job = None
+    while True:
+        if job is None:
+            job = _WRITE_QUEUE.get()
+        if job is None:  # Stop requested
+            _WRITE_QUEUE.task_done()
+            return
+        flush, args, batch_size, row = job
+        rows = [row]
+        job = None
+        # Add scans that follow within WRITE_IDLE_WAIT to the same transaction; keep any
+        # scan for another target (or the stop request) for the next round
+        while len(rows) < batch_size:
+            try:
+                job = _WRITE_QUEUE.get(timeout=WRITE_IDLE_WAIT)
+            except queue.Empty:
+                break
+            if job is None or job[:3] != (flush, args, batch_size):
+                break
+            rows.append(job[3])
+            job = None
+        try:
+            _run_write_job(flush, rows, args)
+        finally:
+            for _ in rows:
+                _WRITE_QUEUE.task_done()
+
+def start_writer():
+    """Start the background thread that writes scans"""
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = threading.Thread(target=_writer_loop, name="scan-writer", daemon=True)
+        _WRITER.start()
+
+def stop_writer():
+    """Write everything still queued and stop the background writer"""
+    global _WRITER
+    if _WRITER is not None:
+        _WRITE_QUEUE.put(None)
+        _WRITER.join()
+        _WRITER = None
+
+def submit_write(flush, row, args, batch_size):
+    """Queue one scan for the background writer, or write it now if the writer is not running"""
+    if _WRITER is None:
+        _run_write_job(flush, [row], args)
+    else:
+        _WRITE_QUEUE.put((flush, args, batch_size, row))  # Waits if the writer is WRITE_QUEUE_SIZE scans behind
+
+def wait_for_writes():
+    """Block until every queued scan has been written"""
+    _WRITE_QUEUE.join()
+
+def take_write_results():
+    """Return the (rows, result, error) of every batch finished since the last call"""
+    results = []
+    while True:
+        try:
+            results.append(_WRITE_RESULTS.get_nowait())
+        except queue.Empty:
+            return results
+
+def is_busy_error(e):
+    """Check if an OperationalError means the database is busy or locked"""
+    code = getattr(e, 'sqlite_errorcode', None)  # Python 3.11+
+    if code is None:
+        return "database is locked" in str(e)
+    return (code & 0xFF) in (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED (incl. extended codes)
+
+def backoff_delay(retry_delay, retries):
+    """Exponential backoff with a little jitter so retrying writers do not collide again"""
+    return retry_delay * 2 ** (retries - 1) + random.uniform(0, 0.05)
+
+@contextlib.contextmanager
+def transaction(conn):
+    """Run a block in one write transaction, rolling back if it fails"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
 
 # Updated database initialization
 def init_database():
-    conn = sqlite3.connect(DB_NAME, timeout=15)
+    conn = get_conn()
     c = conn.cursor()
-    c.execute("PRAGMA journal_mode=WAL;")  # Enable Write-Ahead Logging
-    c.execute("PRAGMA foreign_keys = ON;")  # Enable foreign key constraints
+    # One transaction, so a failed migration step rolls back instead of leaving it open
+    with transaction(conn):
+        # Table for batch scans
+        c.execute('''CREATE TABLE IF NOT EXISTS batch_scans
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     batch_barcode TEXT,
+                     item_type TEXT,
+                     generation TEXT,
+                     created_date TEXT,
+                     quantity INTEGER,
+                     scan_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     status TEXT)''')
+    
+        # Table for individual items
+        c.execute('''CREATE TABLE IF NOT EXISTS items
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     full_barcode TEXT UNIQUE,
+                     batch_barcode TEXT,
+                     item_type TEXT,
+                     generation TEXT,
+                     created_date TEXT,
+                     current_status TEXT DEFAULT 'IN',
+                     item_number INTEGER,
+                     current_location_barcode TEXT,
+                     last_scan_time TIMESTAMP)''')
+    
+        # Add item_number to databases created before it existed
+        c.execute("PRAGMA table_info(items)")
+        if "item_number" not in [col[1] for col in c.fetchall()]:
+            c.execute("ALTER TABLE items ADD COLUMN item_number INTEGER")
+            c.execute("SELECT id, full_barcode FROM items")
+            c.executemany("UPDATE items SET item_number = ? WHERE id = ?",
+                          [(get_item_number(barcode), item_id) for item_id, barcode in c.fetchall()])
     
-    # Table for batch scans
-    c.execute('''CREATE TABLE IF NOT EXISTS batch_scans
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 batch_barcode TEXT,
-                 item_type TEXT,
-                 generation TEXT,
-                 created_date TEXT,
-                 quantity INTEGER,
-                 scan_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                 status TEXT)''')
+        # Table for notes (now on individual items)
+        c.execute('''CREATE TABLE IF NOT EXISTS notes
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     item_id INTEGER,
+                     note TEXT,
+                     FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE)''')
     
-    # Table for individual items
-    c.execute('''CREATE TABLE IF NOT EXISTS items
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 full_barcode TEXT UNIQUE,
-                 batch_barcode TEXT,
-                 item_type TEXT,
-                 generation TEXT,
-                 created_date TEXT,
-                 current_status TEXT DEFAULT 'IN')''')
+        # Table for locations
+        c.execute('''CREATE TABLE IF NOT EXISTS locations
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     barcode TEXT UNIQUE,
+                     location_name TEXT)''')
     
-    # Table for notes (now on individual items)
-    c.execute('''CREATE TABLE IF NOT EXISTS notes
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 item_id INTEGER,
-                 note TEXT,
-                 FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE)''')
+        # Table for location assignments (now on individual items)
+        c.execute('''CREATE TABLE IF NOT EXISTS item_locations
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     item_id INTEGER,
+                     location_barcode TEXT,
+                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE,
+                     FOREIGN KEY (location_barcode) REFERENCES locations(barcode))''')
     
-    # Table for locations
-    c.execute('''CREATE TABLE IF NOT EXISTS locations
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 barcode TEXT UNIQUE,
-                 location_name TEXT)''')
+        # Table for scans (renamed from 'scans' to avoid conflict)
+        c.execute('''CREATE TABLE IF NOT EXISTS item_scans
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     barcode TEXT,
+                     item_type TEXT,
+                     generation TEXT,
+                     created_date TEXT,
+                     scan_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     status TEXT)''')
     
-    # Table for location assignments (now on individual items)
-    c.execute('''CREATE TABLE IF NOT EXISTS item_locations
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 item_id INTEGER,
-                 location_barcode TEXT,
-                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                 FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE,
-                 FOREIGN KEY (location_barcode) REFERENCES locations(barcode))''')
+        # Table for item codes
+        c.execute('''CREATE TABLE IF NOT EXISTS item_codes
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     code TEXT UNIQUE,
+                     name TEXT)''')
     
-    # Table for scans (renamed from 'scans' to avoid conflict)
-    c.execute('''CREATE TABLE IF NOT EXISTS item_scans
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 barcode TEXT,
-                 item_type TEXT,
-                 generation TEXT,
-                 created_date TEXT,
-                 scan_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                 status TEXT)''')
+        # Add current location / last scan to databases created before they existed
+        c.execute("PRAGMA table_info(items)")
+        if "current_location_barcode" not in [col[1] for col in c.fetchall()]:
+            c.execute("ALTER TABLE items ADD COLUMN current_location_barcode TEXT")
+            c.execute("ALTER TABLE items ADD COLUMN last_scan_time TIMESTAMP")
+            c.execute('''UPDATE items SET
+                         current_location_barcode = (SELECT location_barcode FROM item_locations
+                                                     WHERE item_id = items.id
+                                                     ORDER BY timestamp DESC, id DESC LIMIT 1),
+                         last_scan_time = (SELECT MAX(scan_time) FROM item_scans
+                                           WHERE barcode = items.full_barcode)''')
     
-    # Table for item codes
-    c.execute('''CREATE TABLE IF NOT EXISTS item_codes
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 code TEXT UNIQUE,
-                 name TEXT)''')
+        # Keep current location / last scan on items up to date from every write path
+        c.execute("""CREATE TRIGGER IF NOT EXISTS trg_item_location_current AFTER INSERT ON item_locations
+                     BEGIN UPDATE items SET current_location_barcode = NEW.location_barcode WHERE id = NEW.item_id; END""")
+        c.execute("""CREATE TRIGGER IF NOT EXISTS trg_item_scan_last AFTER INSERT ON item_scans
+                     BEGIN UPDATE items SET last_scan_time = NEW.scan_time
+                           WHERE full_barcode = NEW.barcode
+                           AND (last_scan_time IS NULL OR last_scan_time <= NEW.scan_time); END""")
+        # Scan history is keyed by barcode, not item id, so cascade it by hand
+        c.execute("""CREATE TRIGGER IF NOT EXISTS trg_scan_cascade AFTER DELETE ON items
+                     BEGIN DELETE FROM item_scans WHERE barcode = OLD.full_barcode; END""")
     
-    # Insert initial item codes if table is empty
-    c.execute("SELECT COUNT(*) FROM item_codes")
-    if c.fetchone()[0] == 0:
-        for code, name in INITIAL_ITEM_CODES.items():
-            c.execute("INSERT INTO item_codes (code, name) VALUES (?, ?)", (code, name))
+        # Insert initial item codes if table is empty
+        c.execute("SELECT COUNT(*) FROM item_codes")
+        if c.fetchone()[0] == 0:
+            c.executemany("INSERT INTO item_codes (code, name) VALUES (?, ?)", INITIAL_ITEM_CODES.items())
     
-    # Indexes for performance
-    c.execute("CREATE INDEX IF NOT EXISTS idx_batch_barcode ON batch_scans (batch_barcode)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_full_barcode ON items (full_barcode)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_batch_items ON items (batch_barcode)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_item_location ON item_locations (item_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_scan_barcode ON item_scans (barcode)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_item_status ON items (current_status)")
+        # Indexes for performance
+        c.execute("CREATE INDEX IF NOT EXISTS idx_batch_barcode ON batch_scans (batch_barcode)")
+        c.execute("DROP INDEX IF EXISTS idx_full_barcode")  # Duplicated the UNIQUE index on full_barcode
+        c.execute("CREATE INDEX IF NOT EXISTS idx_batch_items ON items (batch_barcode)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_item_location ON item_locations (item_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_location_items ON item_locations (location_barcode)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_scan_barcode ON item_scans (barcode)")
+        # Only OUT rows are ever looked up by status (the report uses the covering index below)
+        c.execute("DROP INDEX IF EXISTS idx_item_status")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_items_out ON items (full_barcode) WHERE current_status = 'OUT'")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_item_number ON items (item_number)")
+        c.execute("DROP INDEX IF EXISTS idx_il_item_ts")  # Duplicated the item_id prefix of idx_item_location
+        c.execute("CREATE INDEX IF NOT EXISTS idx_items_type_gen_status ON items (item_type, generation, current_status)")
+    
+        # One note per item (if an older database has duplicates, merge them into the newest, oldest text first)
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_notes_item'")
+        if not c.fetchone():
+            c.execute("""UPDATE notes SET note = (SELECT group_concat(note, ' | ')
+                                                  FROM (SELECT note FROM notes n2 WHERE n2.item_id = notes.item_id ORDER BY n2.id))
+                         WHERE id IN (SELECT MAX(id) FROM notes GROUP BY item_id HAVING COUNT(*) > 1)""")
+            c.execute("DELETE FROM notes WHERE id NOT IN (SELECT MAX(id) FROM notes GROUP BY item_id)")
+            c.execute("CREATE UNIQUE INDEX idx_notes_item ON notes (item_id)")
     
-    conn.commit()
-    conn.close()
+        # Running count of OUT items, kept up to date by triggers
+        c.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+        c.execute("""INSERT OR IGNORE INTO stats (name, value)
+                     SELECT 'out_count', COUNT(*) FROM items WHERE current_status = 'OUT'""")
+        c.execute("""CREATE TRIGGER IF NOT EXISTS trg_items_out_insert AFTER INSERT ON items
+                     WHEN NEW.current_status IS 'OUT'
+                     BEGIN UPDATE stats SET value = value + 1 WHERE name = 'out_count'; END""")
+        c.execute("""CREATE TRIGGER IF NOT EXISTS trg_items_out_delete AFTER DELETE ON items
+                     WHEN OLD.current_status IS 'OUT'
+                     BEGIN UPDATE stats SET value = value - 1 WHERE name = 'out_count'; END""")
+        c.execute("""CREATE TRIGGER IF NOT EXISTS trg_items_out_update AFTER UPDATE OF current_status ON items
+                     WHEN (OLD.current_status IS 'OUT') <> (NEW.current_status IS 'OUT')
+                     BEGIN UPDATE stats SET value = value + (NEW.current_status IS 'OUT') - (OLD.current_status IS 'OUT')
+                           WHERE name = 'out_count'; END""")
+    
+        # Gather planner statistics once; PRAGMA optimize keeps them fresh on exit
+        c.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        if not c.fetchone():
+            c.execute("ANALYZE")
+
+# Last seen PRAGMA data_version of the read connection; it changes whenever any connection commits
+_DATA_VERSION = None
+
+def _refresh_name_caches():
+    """Drop cached item and location names if the shared database changed since the last lookup"""
+    global _DATA_VERSION
+    version = get_read_conn().execute("PRAGMA data_version").fetchone()[0]
+    if version != _DATA_VERSION:
+        _lookup_item_name.cache_clear()
+        _lookup_location_name.cache_clear()
+        _DATA_VERSION = version
+
+@functools.lru_cache(maxsize=256)
+def _lookup_item_name(code):
+    """Look up item name for a code; cached until the item codes change, misses raise and are not cached"""
+    result = get_read_conn().execute("SELECT name FROM item_codes WHERE code = ?", (code,)).fetchone()
+    if not result:
+        raise KeyError(code)  # Another station may register it, so ask again next time
+    return result[0]
 
 def get_item_name(code):
     """Get item name from code using database"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
     try:
-        c.execute("SELECT name FROM item_codes WHERE code = ?", (code,))
-        result = c.fetchone()
-        return result[0] if result else "Unknown"
+        _refresh_name_caches()  # Another station may have renamed or removed the code
+        return _lookup_item_name(code)
     except:
-        return "Unknown"
-    finally:
-        conn.close()
+        return "Unknown"  # Not cached, so the next scan tries again
 
-def parse_barcode(barcode, is_batch=False):
-    """Parse barcode in format XXXX_DD_MM_YY_GX (batch) or XXXX_DD_MM_YY_GX_XXXX (item)"""
-    parts = barcode.split('_')
-    
-    # Validate part count based on barcode type
-    if is_batch and len(parts) != 5:
-        print(f"Invalid batch barcode: Expected 5 parts, got {len(parts)}")
-        return None
-    elif not is_batch and len(parts) not in (5, 6):
-        print(f"Invalid item barcode: Expected 5 or 6 parts, got {len(parts)}")
+# Barcode parts: XXXX_DD_MM_YY_GX plus optional _XXXX item suffix
+@functools.lru_cache(maxsize=4096)
+def _parse_barcode_cached(barcode):
+    """Split barcode into (item_code, generation, created_date, item_number, suffix, batch_barcode), None if malformed"""
+    match = _BARCODE_RE.fullmatch(barcode)
+    if not match:
         return None
-        
-    item_code = parts[0]
-    day = parts[1]
-    month = parts[2]
-    year = parts[3]
-    generation = parts[4]
+    item_code, day, month, year, generation, suffix = match.groups()
     
     # European date format: DD_MM_YY → DD.MM.YYYY
+    full_year = 2000 + int(year) if int(year) < 100 else int(year)
+    created_date = f"{day}.{month}.{full_year}"
+    batch_barcode = barcode[:match.end(5)]  # First 5 parts
+    return (item_code, generation, created_date, _item_number_from_suffix(suffix), suffix, batch_barcode)
+
+def parse_barcode(barcode, is_batch=False):
+    """Parse barcode in format XXXX_DD_MM_YY_GX (batch) or XXXX_DD_MM_YY_GX_XXXX (item)"""
     try:
-        full_year = 2000 + int(year) if int(year) < 100 else int(year)
-        created_date = f"{day}.{month}.{full_year}"
-        
-        # Item Type translation from database
-        item_type = get_item_name(item_code)
-        
-        return {
-            "item_type": item_type,
-            "generation": generation,
-            "created_date": created_date,
-            "full_barcode": barcode
-        }
+        parts = _parse_barcode_cached(barcode)
     except Exception as e:
         print(f"Parsing error: {e}")
         return None
-
-def ensure_item_exists(full_barcode, item_type, generation, created_date):
-    """Ensure item exists in items table, create if missing"""
-    conn = sqlite3.connect(DB_NAME, timeout=15)
-    try:
-        c = conn.cursor()
-        # Check if item exists
-        c.execute("SELECT 1 FROM items WHERE full_barcode = ?", (full_barcode,))
-        if c.fetchone():
-            return True
-            
-        # Extract batch barcode (first 5 parts)
-        parts = full_barcode.split('_')
-        if len(parts) < 5:
-            print(f"Invalid barcode format: {full_barcode}")
-            return False
-            
-        batch_barcode = '_'.join(parts[:5])
-        
-        # Create new item with default status 'IN'
-        c.execute('''INSERT INTO items 
-                    (full_barcode, batch_barcode, item_type, generation, created_date, current_status)
-                    VALUES (?, ?, ?, ?, ?, ?)''',
-                (full_barcode, batch_barcode, item_type, generation, created_date, 'IN'))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        # Item already exists (race condition)
-        return True
-    except Exception as e:
-        print(f"Error ensuring item exists: {e}")
-        return False
-    finally:
-        conn.close()
-
-def update_item_status(barcode, new_status):
-    """Update the current status of an item"""
-    conn = sqlite3.connect(DB_NAME, timeout=15)
-    try:
-        c = conn.cursor()
-        c.execute("UPDATE items SET current_status = ? WHERE full_barcode = ?", (new_status, barcode))
-        conn.commit()
-        return c.rowcount > 0
-    except Exception as e:
-        print(f"Error updating status: {e}")
-        return False
-    finally:
-        conn.close()
-
-def log_scan(parsed_data, status, max_retries=3, retry_delay=0.2):
-    """Save scan to database with retry on lock"""
-    retries = 0
-    while retries < max_retries:
-        conn = None
-        try:
-            conn = sqlite3.connect(DB_NAME, timeout=15)
-            c = conn.cursor()
-            c.execute('''INSERT INTO item_scans 
-                        (barcode, item_type, generation, created_date, status)
-                        VALUES (?, ?, ?, ?, ?)''',
-                    (parsed_data["full_barcode"],
-                     parsed_data["item_type"],
-                     parsed_data["generation"],
-                     parsed_data["created_date"],
-                     status))
-            conn.commit()
-            return True
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                retries += 1
-                print(f"Database locked, retrying ({retries}/{max_retries})...")
-                time.sleep(retry_delay)
-                continue
-            print(f"Save error: {e}")
-            return False
-        except Exception as e:
-            print(f"Save error: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
-    print(f"Failed to save scan after {max_retries} retries.")
-    return False
+    
+    # Validate part count based on barcode type
+    if parts is None or (is_batch and parts[4] is not None):
+        part_count = barcode.count('_') + 1
+        if is_batch:
+            print(f"Invalid batch barcode: Expected 5 parts, got {part_count}")
+        else:
+            print(f"Invalid item barcode: Expected 5 or 6 parts, got {part_count}")
+        return None
+    
+    item_code, generation, created_date, item_number, _, batch_barcode = parts
+    return {
+        "item_type": get_item_name(item_code),  # Item Type translation from database
+        "generation": generation,
+        "created_date": created_date,
+        "item_number": item_number,
+        "batch_barcode": batch_barcode,
+        "full_barcode": barcode
+    }
 
 def add_note(barcode, note):
     """Add note to a barcode"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+    conn = get_conn()
     
     try:
-        # First get item ID from barcode
-        c.execute("SELECT id FROM items WHERE full_barcode = ?", (barcode,))
-        item_row = c.fetchone()
-        if not item_row:
+        # Create the note, or update it if the item already has one
+        with transaction(conn):
+            c = conn.execute('''INSERT INTO notes (item_id, note)
+                        SELECT id, ? FROM items WHERE full_barcode = ?
+                        ON CONFLICT(item_id) DO UPDATE SET note = excluded.note''',
+                    (note, barcode))
+        if c.rowcount == 0:
             print("Item not found!")
             return False
-            
-        item_id = item_row[0]
-        
-        # Check if note exists
-        c.execute("SELECT * FROM notes WHERE item_id = ?", (item_id,))
-        if c.fetchone():
-            # Update if exists
-            c.execute("UPDATE notes SET note = ? WHERE item_id = ?", (note, item_id))
-        else:
-            # Create new if doesn't exist
-            c.execute("INSERT INTO notes (item_id, note) VALUES (?, ?)", (item_id, note))
-        
-        conn.commit()
         return True
     except Exception as e:
         print(f"Error adding note: {e}")
         return False
-    finally:
-        conn.close()
 
-def get_note(barcode):
-    """Get note for a barcode"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+def get_notes(barcodes):
+    """Get notes for a list of barcodes as {barcode: note}, in one query"""
+    c = get_read_conn().cursor()
     
     try:
-        # Get note via item ID
-        c.execute('''SELECT n.note 
+        # Get notes via item ID; the barcodes go in as one JSON array
+        c.execute('''SELECT i.full_barcode, n.note 
                     FROM notes n
                     JOIN items i ON n.item_id = i.id
-                    WHERE i.full_barcode = ?''', (barcode,))
-        result = c.fetchone()
-        return result[0] if result else ""
-    except:
-        return ""
-    finally:
-        conn.close()
+                    WHERE i.full_barcode IN (SELECT value FROM json_each(?))''', (json.dumps(barcodes),))
+        return dict(c.fetchall())
+    except Exception:
+        return {}
 
-def show_last_scan(parsed_data, status):
-    """Show details of last scan"""
-    note = get_note(parsed_data["full_barcode"])
-    
-    print("\n" + "="*50)
-    print("LAST SCAN:")
-    print(f"Type:      {parsed_data['item_type']}")
-    print(f"Generation:{parsed_data['generation']}")
-    print(f"Date:      {parsed_data['created_date']}")
-    print(f"Status:    {status}")
-    print(f"Note:      {note}")
-    print(f"Barcode:   {parsed_data['full_barcode']}")
-    print("="*50)
+def show_notes(barcodes):
+    """Print the notes of scanned items that have one"""
+    for barcode, note in get_notes(barcodes).items():
+        print(f"Note for {barcode}: {note}")
+
+@functools.lru_cache(maxsize=256)
+def _lookup_location_name(barcode):
+    """Look up location name for a barcode; cached until locations change, misses raise and are not cached"""
+    result = get_read_conn().execute("SELECT location_name FROM locations WHERE barcode = ?", (barcode,)).fetchone()
+    if not result:
+        raise KeyError(barcode)  # Another station may register it, so ask again next time
+    return result[0]
+
+def get_location_name(barcode):
+    """Get location name for a barcode, None if not registered"""
+    _refresh_name_caches()  # Another station may have renamed or removed the location
+    try:
+        return _lookup_location_name(barcode)
+    except KeyError:
+        return None
 
 # ===== TASK 3: LOCATION VALIDATION =====
 def register_location(barcode, location_name):
@@ -350,130 +603,53 @@ def register_location(barcode, location_name):
         print("Location name cannot be empty")
         return False
         
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+    conn = get_conn()
     
     try:
-        c.execute('''INSERT OR REPLACE INTO locations 
-                    (barcode, location_name)
-                    VALUES (?, ?)''',
-                (clean_barcode, location_name))
-        
-        conn.commit()
+        with transaction(conn):
+            conn.execute('''INSERT OR REPLACE INTO locations 
+                        (barcode, location_name)
+                        VALUES (?, ?)''',
+                    (clean_barcode, location_name))
+        _lookup_location_name.cache_clear()
         return True
     except Exception as e:
         print(f"Error registering location: {e}")
         return False
-    finally:
-        conn.close()
 
-def move_item_to_location(item_barcode, location_barcode, max_retries=3, retry_delay=0.2):
-    """Move item to location with retry on lock"""
-    # Clean location barcode
-    clean_location_barcode = to_upper_alphanumeric(location_barcode)
-    
-    retries = 0
-    while retries < max_retries:
-        conn = None
-        try:
-            conn = sqlite3.connect(DB_NAME, timeout=15)
-            c = conn.cursor()
-            
-            # Check if location exists
-            c.execute("SELECT 1 FROM locations WHERE barcode = ?", (clean_location_barcode,))
-            if not c.fetchone():
-                print("Location not registered! Please register first.")
-                return False
-                
-            # Get item ID
-            c.execute("SELECT id FROM items WHERE full_barcode = ?", (item_barcode,))
-            item_row = c.fetchone()
-            if not item_row:
-                print("Item not found in database! Creating now...")
-                # Parse barcode to get item details
-                parsed = parse_barcode(item_barcode)
-                if not parsed:
-                    return False
-                # Ensure item exists
-                if not ensure_item_exists(
-                    item_barcode, 
-                    parsed['item_type'], 
-                    parsed['generation'], 
-                    parsed['created_date']
-                ):
-                    print("Failed to create item")
-                    return False
-                    
-                # Try to get item ID again
-                c.execute("SELECT id FROM items WHERE full_barcode = ?", (item_barcode,))
-                item_row = c.fetchone()
-                if not item_row:
-                    print("Item still not found after creation attempt!")
-                    return False
-                    
-            item_id = item_row[0]
-            
-            # Create location assignment
-            c.execute('''INSERT INTO item_locations 
-                        (item_id, location_barcode)
-                        VALUES (?, ?)''',
-                    (item_id, clean_location_barcode))
-            
-            # Log as IN scan
-            parsed = parse_barcode(item_barcode)
-            if parsed:
-                c.execute('''INSERT INTO item_scans 
-                            (barcode, item_type, generation, created_date, status)
-                            VALUES (?, ?, ?, ?, ?)''',
-                        (item_barcode, 
-                         parsed['item_type'], 
-                         parsed['generation'], 
-                         parsed['created_date'], 
-                         'IN'))
-            
-            conn.commit()
-            return True
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                retries += 1
-                print(f"Database locked, retrying ({retries}/{max_retries})...")
-                time.sleep(retry_delay)
-                continue
-            print(f"Error assigning item: {e}")
-            return False
-        except Exception as e:
-            print(f"Error assigning item: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
-    print(f"Failed to move item after {max_retries} retries.")
-    return False
-
-def get_current_location(item_barcode):
-    """Get current location of an item"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+def register_locations_bulk(lines):
+    """Register 'barcode<TAB>name' lines in one transaction, return how many were saved"""
+    rows = []
+    for line in lines:
+        barcode, _, location_name = line.partition('\t')
+        barcode = barcode.strip().upper()
+        location_name = location_name.strip()
+        if not barcode or not location_name:
+            print(f"Skipping invalid line: {line.strip()}")
+            continue
+        # Same rule as single entry: the label must scan exactly as stored
+        if not is_alphanumeric(barcode):
+            print(f"Skipping line, location barcode must be alphanumeric: {line.strip()}")
+            continue
+        rows.append((barcode, location_name))
+    if not rows:
+        return 0
     
+    conn = get_conn()
     try:
-        c.execute('''SELECT l.location_name 
-                    FROM item_locations il
-                    JOIN locations l ON il.location_barcode = l.barcode
-                    JOIN items i ON il.item_id = i.id
-                    WHERE i.full_barcode = ?
-                    ORDER BY il.timestamp DESC
-                    LIMIT 1''', (item_barcode,))
-        result = c.fetchone()
-        return result[0] if result else "No location"
-    except:
-        return "Error"
-    finally:
-        conn.close()
+        with transaction(conn):
+            conn.executemany('''INSERT OR REPLACE INTO locations 
+                            (barcode, location_name)
+                            VALUES (?, ?)''', rows)
+        _lookup_location_name.cache_clear()
+        return len(rows)
+    except Exception as e:
+        print(f"Error registering locations: {e}")
+        return 0
 
 def generate_inventory_report():
     """Generate live inventory report based on current status"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+    c = get_read_conn().cursor()
     
     try:
         # Calculate inventory from items table
@@ -486,8 +662,6 @@ def generate_inventory_report():
                     FROM items
                     GROUP BY item_type, generation''')
         
-        results = c.fetchall()
-        
         # Generate report
         print("\n" + "="*60)
         print("CURRENT INVENTORY REPORT")
@@ -496,22 +670,20 @@ def generate_inventory_report():
         print(f"{'Type':<15} {'Gen':<5} {'Total':<7} {'In Stock':<11} {'Out':<11} {'Available':<9}")
         print("-"*60)
         
-        for row in results:
-            item_type, gen, total, in_stock, out = row
+        for item_type, gen, total, in_stock, out in c:  # Stream rows straight from the cursor
             # Available = In Stock (only IN items are available)
             print(f"{item_type:<15} {gen:<5} {total:<7} {in_stock:<11} {out:<11} {in_stock:<9}")
         
         print("="*60)
-    finally:
-        conn.close()
+    except Exception as e:
+        print(f"Error generating inventory report: {e}")
 
 def generate_detailed_report(item_type=None, generation=None, location_barcode=None, date=None):
     """Generate detailed report with filtering options - shows latest status per item"""
     # Initialize location display name
     loc_display = location_barcode if location_barcode else None
     
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+    c = get_read_conn().cursor()
     
     try:
         # Get latest scan for each item
@@ -520,28 +692,13 @@ def generate_detailed_report(item_type=None, generation=None, location_barcode=N
                     i.item_type,
                     i.generation,
                     i.created_date,
-                    s.scan_time,
+                    COALESCE(strftime('%d.%m.%Y %H:%M', i.last_scan_time), 'N/A') as scan_time_fmt,
                     i.current_status,
                     COALESCE(n.note, '') as note,
                     COALESCE(l.location_name, 'No location') as location_name
                 FROM items i
-                LEFT JOIN (
-                    SELECT barcode, MAX(scan_time) as max_time
-                    FROM item_scans
-                    GROUP BY barcode
-                ) latest ON i.full_barcode = latest.barcode
-                LEFT JOIN item_scans s ON s.barcode = i.full_barcode AND s.scan_time = latest.max_time
                 LEFT JOIN notes n ON n.item_id = i.id
-                LEFT JOIN (
-                    SELECT il.item_id, l.location_name
-                    FROM item_locations il
-                    JOIN locations l ON il.location_barcode = l.barcode
-                    WHERE il.timestamp = (
-                        SELECT MAX(timestamp)
-                        FROM item_locations
-                        WHERE item_id = il.item_id
-                    )
-                ) l ON l.item_id = i.id"""
+                LEFT JOIN locations l ON l.barcode = i.current_location_barcode"""
         
         params = []
         conditions = []
@@ -556,10 +713,9 @@ def generate_detailed_report(item_type=None, generation=None, location_barcode=N
             clean_location_barcode = to_upper_alphanumeric(location_barcode)
             if clean_location_barcode:
                 # Try to get location name
-                c.execute("SELECT location_name FROM locations WHERE barcode = ?", (clean_location_barcode,))
-                result = c.fetchone()
-                if result:
-                    loc_display = result[0]
+                location_name = get_location_name(clean_location_barcode)
+                if location_name:
+                    loc_display = location_name
                     conditions.append("l.location_name = ?")
                     params.append(loc_display)
                 else:
@@ -574,7 +730,6 @@ def generate_detailed_report(item_type=None, generation=None, location_barcode=N
             query += " WHERE " + " AND ".join(conditions)
         
         c.execute(query, params)
-        results = c.fetchall()
         
         # Generate report
         print("\n" + "="*120)
@@ -591,55 +746,26 @@ def generate_detailed_report(item_type=None, generation=None, location_barcode=N
         print(f"{'Scan Time':<19} {'Type':<12} {'Gen':<5} {'Status':<8} {'Create Date':<12} {'Location':<15} {'Barcode':<20} {'Note':<30}")
         print("-"*120)
         
-        for row in results:
-            scan_time = row[4]
-            if scan_time:
-                try:
-                    # Convert to datetime object if it's a string
-                    if isinstance(scan_time, str):
-                        scan_time = datetime.datetime.strptime(scan_time, "%Y-%m-%d %H:%M:%S")
-                    formatted_time = scan_time.strftime("%d.%m.%Y %H:%M")
-                except:
-                    formatted_time = "N/A"
-            else:
-                formatted_time = "N/A"
-                
-            print(f"{formatted_time:<19} {row[1]:<12} {row[2]:<5} {row[5]:<8} {row[3]:<12} {row[7]:<15} {row[0]:<20} {row[6]:<30}")
+        total = 0
+        for row in c:  # Stream rows instead of materializing the whole report
+            total += 1
+            print(f"{row[4]:<19} {row[1]:<12} {row[2]:<5} {row[5]:<8} {row[3]:<12} {row[7]:<15} {row[0]:<20} {row[6]:<30}")
         
-        print(f"\nTotal entries: {len(results)}")
+        print(f"\nTotal entries: {total}")
         print("="*120)
     except Exception as e:
         print(f"Error generating report: {e}")
-    finally:
-        conn.close()
 
 def get_highest_item_number():
     """Find the highest item number across all batches"""
-    conn = sqlite3.connect(DB_NAME, timeout=15)
     try:
-        c = conn.cursor()
-        c.execute("SELECT full_barcode FROM items")
-        existing_barcodes = [row[0] for row in c.fetchall()]
-        
-        max_num = 0
-        for barcode in existing_barcodes:
-            parts = barcode.split('_')
-            if len(parts) == 6:
-                try:
-                    # Extract the numeric part at the end
-                    num_part = parts[5]
-                    if num_part.isdigit():
-                        num = int(num_part)
-                        if num > max_num:
-                            max_num = num
-                except ValueError:
-                    continue
-        return max_num
+        c = get_conn().cursor()
+        # Indexed lookup on the stored numeric suffix
+        c.execute("SELECT MAX(item_number) FROM items")
+        return c.fetchone()[0] or 0
     except Exception as e:
         print(f"Error finding highest item number: {e}")
         return 0
-    finally:
-        conn.close()
 
 def create_batch():
     """Create a new batch with unique item IDs and assign location"""
@@ -652,18 +778,13 @@ def create_batch():
         return
         
     # Validate location exists
-    conn = sqlite3.connect(DB_NAME, timeout=15)
-    c = conn.cursor()
     try:
-        c.execute("SELECT 1 FROM locations WHERE barcode = ?", (location_barcode,))
-        if not c.fetchone():
+        if get_location_name(location_barcode) is None:
             print("Location not registered! Please register first.")
             return
     except:
         print("Error validating location")
         return
-    finally:
-        conn.close()
     
     # THEN: Scan batch barcode
     barcode_input = input("Scan batch or item barcode: ").strip()
@@ -674,15 +795,8 @@ def create_batch():
         print("Invalid barcode format!")
         return
     
-    # Extract batch base from barcode
-    parts = barcode_input.split('_')
-    if len(parts) == 6:
-        batch_base = '_'.join(parts[:5])
-    elif len(parts) == 5:
-        batch_base = barcode_input
-    else:
-        print("Invalid barcode format! Must be 5 or 6 parts")
-        return
+    # Batch base from barcode (parse_barcode only accepts 5 or 6 parts)
+    batch_base = parsed['batch_barcode']
     
     # Find highest existing item number across ALL batches
     max_num = get_highest_item_number()
@@ -699,60 +813,125 @@ def create_batch():
         return
     
     # Create batch record
-    conn = sqlite3.connect(DB_NAME, timeout=15)
+    conn = get_conn()
+    c = conn.cursor()
     try:
-        c = conn.cursor()
-        # Insert batch scan record
-        c.execute('''INSERT INTO batch_scans 
-                    (batch_barcode, item_type, generation, created_date, quantity, status)
-                    VALUES (?, ?, ?, ?, ?, ?)''',
-                (batch_base, parsed['item_type'], parsed['generation'], 
-                 parsed['created_date'], quantity, 'CREATED'))
-        
-        # Create new items
-        for i in range(start_num, start_num + quantity):
-            suffix = f"{i:04d}"
-            full_barcode = f"{batch_base}_{suffix}"
-            
-            # Insert item
-            c.execute('''INSERT INTO items 
-                        (full_barcode, batch_barcode, item_type, generation, created_date, current_status)
+        # BEGIN IMMEDIATE takes the write lock up front so contention surfaces before any insert
+        with transaction(conn):
+            # Insert batch scan record
+            c.execute('''INSERT INTO batch_scans 
+                        (batch_barcode, item_type, generation, created_date, quantity, status)
                         VALUES (?, ?, ?, ?, ?, ?)''',
-                    (full_barcode, batch_base, parsed['item_type'], 
-                     parsed['generation'], parsed['created_date'], 'IN'))
-            
-            # Get item ID
-            item_id = c.lastrowid
-            
-            # Assign location
-            c.execute('''INSERT INTO item_locations 
+                    (batch_base, parsed['item_type'], parsed['generation'], 
+                     parsed['created_date'], quantity, 'CREATED'))
+        
+            # Create new items in one statement, numbering them inside SQLite
+            end_num = start_num + quantity - 1
+            c.execute('''WITH RECURSIVE seq(n) AS (
+                            SELECT ? UNION ALL SELECT n + 1 FROM seq WHERE n < ?
+                        )
+                        INSERT INTO items
+                        (full_barcode, batch_barcode, item_type, generation, created_date, current_status, item_number)
+                        SELECT ? || '_' || printf('%04d', n), ?, ?, ?, ?, 'IN', n FROM seq''',
+                    (start_num, end_num, batch_base, batch_base, parsed['item_type'],
+                     parsed['generation'], parsed['created_date']))
+
+            # Assign location (numbers above the previous maximum are only the new items)
+            c.execute('''INSERT INTO item_locations
                         (item_id, location_barcode)
-                        VALUES (?, ?)''',
-                    (item_id, location_barcode))
-            
-            # Log as IN scan
-            c.execute('''INSERT INTO item_scans 
+                        SELECT id, ? FROM items
+                        WHERE batch_barcode = ? AND item_number BETWEEN ? AND ?
+                        ORDER BY id''',
+                    (location_barcode, batch_base, start_num, end_num))
+
+            # Log as IN scans
+            c.execute('''INSERT INTO item_scans
                         (barcode, item_type, generation, created_date, status)
-                        VALUES (?, ?, ?, ?, ?)''',
-                    (full_barcode, parsed['item_type'], parsed['generation'], 
-                     parsed['created_date'], 'IN'))
-        
-        conn.commit()
+                        SELECT full_barcode, item_type, generation, created_date, 'IN' FROM items
+                        WHERE batch_barcode = ? AND item_number BETWEEN ? AND ?
+                        ORDER BY id''',
+                    (batch_base, start_num, end_num))
+
         print(f"Created {quantity} items for batch {batch_base} at location {location_barcode}")
-        print(f"Items range: {batch_base}_{start_num:04d} to {batch_base}_{start_num+quantity-1:04d}")
+        print(f"Items range: {batch_base}_{start_num:04d} to {batch_base}_{end_num:04d}")
         
     except sqlite3.IntegrityError as e:
-        conn.rollback()
         print(f"Database error: {e}. Batch creation aborted.")
     except Exception as e:
-        conn.rollback()
         print(f"Error: {e}")
-    finally:
-        conn.close()
+
+# Most scanned items the writer puts in one transaction in move mode
+MOVE_BATCH_SIZE = 25
+
+def flush_moves(conn, pending, target_location, max_retries=2, retry_delay=0.2):
+    """Write queued moves in one transaction, retrying once if busy; return (created barcodes, OUT to IN count)"""
+    retries = 0
+    while True:
+        try:
+            with transaction(conn):
+                c = conn.cursor()
+                # Ids are AUTOINCREMENT, so anything above this was created by this flush
+                c.execute("SELECT COALESCE(MAX(id), 0) FROM items")
+                last_id = c.fetchone()[0]
+                c.execute("SELECT value FROM stats WHERE name = 'out_count'")
+                out_before = c.fetchone()[0]
+                
+                item_ids = []
+                for barcode, batch_barcode, parsed, _ in pending:
+                    # Create the item, or set an existing one back to IN, and get its id
+                    c.execute('''INSERT INTO items 
+                                (full_barcode, batch_barcode, item_type, generation, created_date, current_status, item_number)
+                                VALUES (?, ?, ?, ?, ?, 'IN', ?)
+                                ON CONFLICT(full_barcode) DO UPDATE SET current_status = 'IN'
+                                RETURNING id''',
+                            (barcode, batch_barcode, parsed['item_type'], 
+                             parsed['generation'], parsed['created_date'], parsed['item_number']))
+                    item_ids.append(c.fetchone()[0])
+                
+                created = sorted({barcode for (barcode, _, _, _), item_id in zip(pending, item_ids) if item_id > last_id})
+                c.execute("SELECT value FROM stats WHERE name = 'out_count'")
+                checked_in = out_before - c.fetchone()[0]
+
+                # Create location assignments, stamped with the time each item was scanned
+                c.executemany('''INSERT INTO item_locations 
+                                (item_id, location_barcode, timestamp)
+                                VALUES (?, ?, ?)''',
+                            [(item_id, target_location, scan_time)
+                             for item_id, (_, _, _, scan_time) in zip(item_ids, pending)])
+                
+                # Log as IN scans
+                c.executemany('''INSERT INTO item_scans 
+                                (barcode, item_type, generation, created_date, status, scan_time)
+                                VALUES (?, ?, ?, ?, 'IN', ?)''',
+                            [(barcode, parsed['item_type'], parsed['generation'], 
+                              parsed['created_date'], scan_time) for barcode, _, parsed, scan_time in pending])
+
+            return created, checked_in
+        except sqlite3.OperationalError as e:
+            retries += 1
+            if not is_busy_error(e) or retries >= max_retries:
+                raise
+            time.sleep(backoff_delay(retry_delay, retries))
+
+def show_move_results(location_name):
+    """Print the outcome of move batches the writer has finished"""
+    for rows, result, error in take_write_results():
+        barcodes = [barcode for barcode, _, _, _ in rows]
+        if error:
+            print(f"Error moving items: {error}")
+            print(f"NOT SAVED, scan again: {', '.join(barcodes)}")
+            continue
+        created, checked_in = result
+        for barcode in created:
+            print(f"{barcode}: item not found, created")
+        if checked_in:
+            print(f"{checked_in} item(s) changed from OUT to IN")
+        print(f"✓ {len(rows)} item(s) moved to {location_name}")
+        show_notes(barcodes)
 
 # ===== TASK 4: ADDED FINISH NOTE TO PROMPT =====
 def move_item_session():
-    """Move items to new location using single DB connection"""
+    """Move items to new location, saving each scan on the background writer"""
     print("\nMOVE ITEMS MODE - Scan items")
     print("First scan TARGET location barcode (e.g. 'TENT1')")
     print("Scan/type 'finish' to return to menu")
@@ -769,21 +948,16 @@ def move_item_session():
         print("Please scan a LOCATION barcode instead.")
         return
     
-    # Single connection for entire session
-    conn = sqlite3.connect(DB_NAME, timeout=15)
-    try:
-        c = conn.cursor()
-        
-        # Validate location ONCE and get name
-        c.execute("SELECT location_name FROM locations WHERE barcode = ?", (target_location,))
-        result = c.fetchone()
-        if not result:
-            print("Location not registered! Please register first.")
-            return
-        location_name = result[0]
-        print(f"Target location: {location_name}")
+    # Validate location ONCE and get name
+    location_name = get_location_name(target_location)
+    if location_name is None:
+        print("Location not registered! Please register first.")
+        return
+    print(f"Target location: {location_name}")
 
+    try:
         while True:
+            show_move_results(location_name)
             barcode = input("\nScan item barcode (or 'finish' to exit): ").strip()
             
             if barcode.lower() == "finish":
@@ -794,80 +968,100 @@ def move_item_session():
             if not parsed:
                 continue
                 
-            # Move item using existing connection
-            try:
-                # Ensure item exists
-                c.execute("SELECT id, current_status FROM items WHERE full_barcode = ?", (barcode,))
-                item_row = c.fetchone()
-                if not item_row:
-                    print("Item not found! Creating now...")
-                    # Extract batch barcode (first 5 parts)
-                    parts = barcode.split('_')
-                    if len(parts) < 5:
-                        print("Invalid barcode format")
-                        continue
-                    batch_barcode = '_'.join(parts[:5])
-                    
-                    # Create new item with status IN
-                    c.execute('''INSERT INTO items 
-                                (full_barcode, batch_barcode, item_type, generation, created_date, current_status)
-                                VALUES (?, ?, ?, ?, ?, ?)''',
-                            (barcode, batch_barcode, parsed['item_type'], 
-                             parsed['generation'], parsed['created_date'], 'IN'))
-                    
-                    # Get the new item ID
-                    c.execute("SELECT id FROM items WHERE full_barcode = ?", (barcode,))
-                    item_row = c.fetchone()
-                    if not item_row:
-                        print("Failed to create item")
-                        continue
-                    item_id = item_row[0]
-                else:
-                    item_id, current_status = item_row
-                    # If item was checked out, change status to IN
-                    if current_status == 'OUT':
-                        c.execute("UPDATE items SET current_status = 'IN' WHERE id = ?", (item_id,))
-                        print("Item status changed to IN")
-
-                # Create location assignment
-                c.execute('''INSERT INTO item_locations 
-                            (item_id, location_barcode)
-                            VALUES (?, ?)''',
-                        (item_id, target_location))
-                
-                # Log as IN scan
-                c.execute('''INSERT INTO item_scans 
-                            (barcode, item_type, generation, created_date, status)
-                            VALUES (?, ?, ?, ?, ?)''',
-                        (barcode, parsed['item_type'], parsed['generation'], 
-                         parsed['created_date'], 'IN'))
+            # Hand the scan to the writer right away, with the time it was scanned (UTC, like CURRENT_TIMESTAMP)
+            scan_time = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            submit_write(flush_moves, (barcode, parsed['batch_barcode'], parsed, scan_time),
+                         (target_location,), MOVE_BATCH_SIZE)
+            print(f"Saving to {location_name}...")
+    finally:
+        # Let the writer finish before leaving, also on Ctrl+C
+        wait_for_writes()
+        show_move_results(location_name)
+
+# Most scanned items the writer puts in one transaction in check out mode
+CHECKOUT_BATCH_SIZE = 50
+
+def flush_checkouts(conn, pending, max_retries=2, retry_delay=0.2):
+    """Write queued check outs and their scan log in one transaction, retrying once if busy_timeout runs out"""
+    retries = 0
+    while True:
+        try:
+            with transaction(conn):
+                # Create missing items directly as OUT, set existing ones to OUT
+                conn.executemany('''INSERT INTO items 
+                                (full_barcode, batch_barcode, item_type, generation, created_date, current_status, item_number)
+                                VALUES (?, ?, ?, ?, ?, 'OUT', ?)
+                                ON CONFLICT(full_barcode) DO UPDATE SET current_status = excluded.current_status''',
+                            [(barcode, parsed['batch_barcode'], parsed['item_type'], parsed['generation'],
+                              parsed['created_date'], parsed['item_number']) for barcode, parsed, _ in pending])
                 
-                conn.commit()
-                print(f"✓ Item moved to {location_name}")
+                # Log as OUT scans with the time each was scanned
+                conn.executemany('''INSERT INTO item_scans 
+                                (barcode, item_type, generation, created_date, status, scan_time)
+                                VALUES (?, ?, ?, ?, 'OUT', ?)''',
+                            [(barcode, parsed['item_type'], parsed['generation'], 
+                              parsed['created_date'], scan_time) for barcode, parsed, scan_time in pending])
+            
+            return None
+        except sqlite3.OperationalError as e:
+            retries += 1
+            if not is_busy_error(e) or retries >= max_retries:
+                raise
+            time.sleep(backoff_delay(retry_delay, retries))
+
+def show_checkout_results():
+    """Print the outcome of check out batches the writer has finished"""
+    for rows, _, error in take_write_results():
+        barcodes = [barcode for barcode, _, _ in rows]
+        if error:
+            print(f"Error checking out items: {error}")
+            print(f"NOT SAVED, scan again: {', '.join(barcodes)}")
+            continue
+        print(f"✓ {len(rows)} item(s) checked out")
+        show_notes(barcodes)
+
+def checkout_session():
+    """Check out items (OUT), saving each scan on the background writer"""
+    # For OUT, we don't need location
+    print("\nCHECK OUT MODE - Scan items (type 'finish' to exit)")
+    print("Scan/type 'finish' to return to menu")
+    
+    try:
+        while True:
+            show_checkout_results()
+            barcode = input("\nScan item barcode (or 'finish' to exit): ").strip()
+            
+            if barcode.lower() == "finish":
+                break
                 
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e):
-                    print("Database busy, retrying...")
-                    conn.rollback()
-                    time.sleep(0.2)  # Short delay before retry
-                    continue
-                print(f"Error moving item: {e}")
-            except Exception as e:
-                print(f"Error moving item: {e}")
-                conn.rollback()
+            # Parse as individual barcode (6 parts)
+            parsed = parse_barcode(barcode)
+            if not parsed:
+                print("Invalid barcode! Expected format: XXXX_DD_MM_YY_GX_XXXX")
+                continue
+            
+            # Hand the scan to the writer right away, with the time it was scanned (UTC, like CURRENT_TIMESTAMP)
+            scan_time = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            submit_write(flush_checkouts, (barcode, parsed, scan_time), (), CHECKOUT_BATCH_SIZE)
+            print("Saving check out...")
     finally:
-        conn.close()  # Ensure connection closes
+        # Let the writer finish before leaving, also on Ctrl+C
+        wait_for_writes()
+        show_checkout_results()
+        generate_inventory_report()
+
+# Rows written per chunk when streaming the location and item code listings
+LISTING_CHUNK_SIZE = 500
 
 def list_locations():
     """List all registered locations"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+    c = get_read_conn().cursor()
     
     try:
         c.execute("SELECT barcode, location_name FROM locations")
-        locations = c.fetchall()
+        first = c.fetchone()  # Probe for an empty table, then stream the rest from the cursor
         
-        if not locations:
+        if not first:
             print("No locations registered yet!")
             return
             
@@ -876,13 +1070,14 @@ def list_locations():
         print("="*40)
         print(f"{'Barcode':<15} {'Location Name':<25}")
         print("-"*40)
-        for loc in locations:
-            print(f"{loc[0]:<15} {loc[1]:<25}")
+        # Stream from the cursor in chunks, one write per chunk instead of one per line
+        rows = [first]
+        while rows:
+            sys.stdout.write("".join(f"{loc[0]:<15} {loc[1]:<25}\n" for loc in rows))
+            rows = c.fetchmany(LISTING_CHUNK_SIZE)
         print("="*40)
     except Exception as e:
         print(f"Error listing locations: {e}")
-    finally:
-        conn.close()
 
 def remove_location():
     """Remove a location from the system"""
@@ -891,47 +1086,48 @@ def remove_location():
         print("No barcode provided!")
         return
         
-    conn = sqlite3.connect(DB_NAME, timeout=10)
+    conn = get_conn()
     try:
         c = conn.cursor()
         
-        # Check if location exists
-        c.execute("SELECT location_name FROM locations WHERE barcode = ?", (barcode,))
-        result = c.fetchone()
-        if not result:
-            print("Location not found!")
-            return
-            
-        location_name = result[0]
-        
-        # Check if location has assigned items
-        c.execute("SELECT COUNT(*) FROM item_locations WHERE location_barcode = ?", (barcode,))
-        count = c.fetchone()[0]
+        # Delete location unless items are assigned to it
+        with transaction(conn):
+            c.execute("""DELETE FROM locations WHERE barcode = ?
+                         AND NOT EXISTS (SELECT 1 FROM item_locations WHERE location_barcode = ?)
+                         RETURNING location_name""", (barcode, barcode))
+            result = c.fetchall()
         
-        if count > 0:
-            print(f"Cannot remove '{location_name}' - it has {count} items assigned!")
+        if not result:
+            # Nothing deleted: tell a missing location from one still in use
+            c.execute("""SELECT location_name,
+                                (SELECT COUNT(*) FROM (SELECT 1 FROM item_locations WHERE location_barcode = ? LIMIT 1001))
+                         FROM locations WHERE barcode = ?""", (barcode, barcode))
+            result = c.fetchone()
+            if not result:
+                print("Location not found!")
+                return
+            # Count stops at 1001, shown as 1000+
+            location_name, count = result
+            shown = "1000+" if count > 1000 else count
+            print(f"Cannot remove '{location_name}' - it has {shown} items assigned!")
             return
             
-        # Delete location
-        c.execute("DELETE FROM locations WHERE barcode = ?", (barcode,))
-        conn.commit()
+        location_name = result[0][0]
+        _lookup_location_name.cache_clear()
         print(f"Location '{location_name}' removed successfully!")
         
     except Exception as e:
         print(f"Error removing location: {e}")
-    finally:
-        conn.close()
 
 def list_item_codes():
     """List all registered item codes"""
-    conn = sqlite3.connect(DB_NAME, timeout=10)
-    c = conn.cursor()
+    c = get_read_conn().cursor()
     
     try:
         c.execute("SELECT code, name FROM item_codes")
-        codes = c.fetchall()
+        first = c.fetchone()  # Probe for an empty table, then stream the rest from the cursor
         
-        if not codes:
+        if not first:
             print("No item codes registered yet!")
             return
             
@@ -940,13 +1136,14 @@ def list_item_codes():
         print("="*40)
         print(f"{'Code':<10} {'Item Name':<25}")
         print("-"*40)
-        for code in codes:
-            print(f"{code[0]:<10} {code[1]:<25}")
+        # Stream from the cursor in chunks, one write per chunk instead of one per line
+        rows = [first]
+        while rows:
+            sys.stdout.write("".join(f"{code[0]:<10} {code[1]:<25}\n" for code in rows))
+            rows = c.fetchmany(LISTING_CHUNK_SIZE)
         print("="*40)
     except Exception as e:
         print(f"Error listing item codes: {e}")
-    finally:
-        conn.close()
 
 # ===== TASK 3: ITEM CODE VALIDATION =====
 def add_or_update_item_code():
@@ -964,7 +1161,7 @@ def add_or_update_item_code():
         print("Item code must be alphanumeric!")
         return
         
-    conn = sqlite3.connect(DB_NAME, timeout=10)
+    conn = get_conn()
     try:
         c = conn.cursor()
         
@@ -972,19 +1169,18 @@ def add_or_update_item_code():
         c.execute("SELECT 1 FROM item_codes WHERE code = ?", (code,))
         exists = c.fetchone()
         
-        if exists:
-            c.execute("UPDATE item_codes SET name = ? WHERE code = ?", (name, code))
-            action = "updated"
-        else:
-            c.execute("INSERT INTO item_codes (code, name) VALUES (?, ?)", (code, name))
-            action = "added"
+        with transaction(conn):
+            if exists:
+                c.execute("UPDATE item_codes SET name = ? WHERE code = ?", (name, code))
+                action = "updated"
+            else:
+                c.execute("INSERT INTO item_codes (code, name) VALUES (?, ?)", (code, name))
+                action = "added"
+        _lookup_item_name.cache_clear()  # Scans must see the new name
             
-        conn.commit()
         print(f"Item code '{code}' successfully {action}!")
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        conn.close()
 
 def remove_item_code():
     """Remove an item code from the system"""
@@ -993,89 +1189,88 @@ def remove_item_code():
         print("No code provided!")
         return
         
-    conn = sqlite3.connect(DB_NAME, timeout=10)
+    conn = get_conn()
     try:
         c = conn.cursor()
         
-        # Check if code exists
-        c.execute("SELECT name FROM item_codes WHERE code = ?", (code,))
-        result = c.fetchone()
-        if not result:
-            print("Item code not found!")
-            return
-            
-        name = result[0]
-        
-        # Check if code is used in any items
-        c.execute("SELECT COUNT(*) FROM items WHERE item_type = ?", (name,))
-        count = c.fetchone()[0]
+        # Delete code unless items use it
+        with transaction(conn):
+            c.execute("""DELETE FROM item_codes WHERE code = ?
+                         AND NOT EXISTS (SELECT 1 FROM items WHERE item_type = item_codes.name)""", (code,))
+            deleted = c.rowcount
         
-        if count > 0:
-            print(f"Cannot remove '{code}' - it has {count} items associated with it!")
+        if not deleted:
+            # Nothing deleted: tell a missing code from one still in use
+            c.execute("""SELECT (SELECT COUNT(*) FROM (SELECT 1 FROM items WHERE item_type = item_codes.name LIMIT 1001))
+                         FROM item_codes WHERE code = ?""", (code,))
+            result = c.fetchone()
+            if not result:
+                print("Item code not found!")
+                return
+            # Count stops at 1001, shown as 1000+
+            count = result[0]
+            shown = "1000+" if count > 1000 else count
+            print(f"Cannot remove '{code}' - it has {shown} items associated with it!")
             return
             
-        # Delete code
-        c.execute("DELETE FROM item_codes WHERE code = ?", (code,))
-        conn.commit()
+        _lookup_item_name.cache_clear()
         print(f"Item code '{code}' removed successfully!")
         
     except Exception as e:
         print(f"Error removing item code: {e}")
-    finally:
-        conn.close()
 
 def manage_locations():
     """Location management menu"""
     while True:
-        print("\n" + "="*30)
-        print("LOCATION MANAGEMENT")
-        print("="*30)
-        print("1: Register new location")
-        print("2: List all locations")
-        print("3: Remove a location")
-        print("4: Back to main menu")
+        print(LOCATION_MENU_BANNER)
         
         choice = input("Select: ").strip()
         
-        if choice == "1":
-            register_location_session()
-        elif choice == "2":
-            list_locations()
-        elif choice == "3":
-            remove_location()
-        elif choice == "4":
+        if choice == "4":
             break
+        handler = LOCATION_MENU.get(choice)
+        if handler:
+            handler()
         else:
             print("Invalid selection!")
 
 def manage_item_codes():
     """Item code management menu"""
     while True:
-        print("\n" + "="*30)
-        print("ITEM CODE MANAGEMENT")
-        print("="*30)
-        print("1: List all item codes")
-        print("2: Add/Update item code")
-        print("3: Remove item code")
-        print("4: Back to main menu")
+        print(ITEM_CODE_MENU_BANNER)
         
         choice = input("Select: ").strip()
         
-        if choice == "1":
-            list_item_codes()
-        elif choice == "2":
-            add_or_update_item_code()
-        elif choice == "3":
-            remove_item_code()
-        elif choice == "4":
+        if choice == "4":
             break
+        handler = ITEM_CODE_MENU.get(choice)
+        if handler:
+            handler()
         else:
             print("Invalid selection!")
 
 def register_location_session():
     """Register new location with validation"""
     print("\nREGISTER NEW LOCATION")
-    location_barcode = input("Location barcode: ").strip().upper()
+    print("(Paste 'barcode<TAB>name' lines to register several, blank line to finish)")
+    location_barcode = input("Location barcode: ")
+    
+    # Bulk mode: one 'barcode<TAB>name' per line, saved together
+    if '\t' in location_barcode:
+        lines = [location_barcode]
+        while True:
+            try:
+                line = input()
+            except EOFError:
+                break
+            if not line.strip():
+                break
+            lines.append(line)
+        count = register_locations_bulk(lines)
+        print(f"{count} location(s) successfully registered!")
+        return
+    
+    location_barcode = location_barcode.strip().upper()
     location_name = input("Location name (e.g. 'Shelf 1'): ").strip()
     
     if not location_barcode or not location_name:
@@ -1098,21 +1293,17 @@ def add_notes_session():
     print("\nADD NOTES MODE - Scan items (type 'finish' to exit)")
     print("Scan/type 'finish' to return to menu")
     
+    # One read cursor for the whole session
+    c = get_read_conn().cursor()
     while True:
         barcode = input("\nScan barcode (or 'finish' to exit): ").strip()
         if barcode.lower() == "finish":
             break
             
         # Check if barcode exists
-        conn = sqlite3.connect(DB_NAME, timeout=10)
-        c = conn.cursor()
-        try:
-            c.execute("SELECT * FROM items WHERE full_barcode = ?", (barcode,))
-            if not c.fetchone():
-                print("Barcode not found! Skipping.")
-                continue
-        finally:
-            conn.close()
+        if not c.execute("SELECT 1 FROM items WHERE full_barcode = ? LIMIT 1", (barcode,)).fetchone():
+            print("Barcode not found! Skipping.")
+            continue
         
         note = input(f"Enter note for {barcode}: ").strip()
         
@@ -1121,136 +1312,153 @@ def add_notes_session():
         else:
             print("Error saving note!")
 
+# Everything that is not an ASCII letter; the confirmation only has to match DELETEALL
+_NON_LETTERS_RE = re.compile(r'[^A-Za-z]+')
+
 def delete_all_out_items():
     """Delete all items with OUT status and their associated data"""
+    # Trigger-maintained counter on the read connection: no scan and no write lock
+    # when there is nothing to delete, and no confirmation prompt either
+    try:
+        out_count = get_read_conn().execute("SELECT value FROM stats WHERE name = 'out_count'").fetchone()[0]
+    except Exception as e:
+        print(f"Error counting OUT items: {e}")
+        return
+    if out_count == 0:
+        print("No OUT items found. Nothing deleted.")
+        return
+    
     print("\nWARNING: This will permanently delete ALL items marked as OUT!")
     confirm = input("Are you sure? (type 'DELETE ALL' to confirm): ").strip()
     
     # Case-insensitive comparison with typo tolerance
-    normalized_confirm = ''.join(filter(str.isalpha, confirm.upper()))
+    normalized_confirm = _NON_LETTERS_RE.sub('', confirm).upper()
     if normalized_confirm != "DELETEALL":
         print("Operation cancelled.")
         return
 
-    conn = sqlite3.connect(DB_NAME, timeout=15)
+    conn = get_conn()
     try:
         c = conn.cursor()
-        # Get count of OUT items BEFORE deletion
-        c.execute("SELECT COUNT(*) FROM items WHERE current_status = 'OUT'")
-        out_count = c.fetchone()[0]
-        
-        if out_count == 0:
-            print("No OUT items found. Nothing deleted.")
-            return
-            
-        # Delete all related data for OUT items
-        # 1. Delete notes for OUT items
-        c.execute("DELETE FROM notes WHERE item_id IN (SELECT id FROM items WHERE current_status = 'OUT')")
-        
-        # 2. Delete location history for OUT items
-        c.execute("DELETE FROM item_locations WHERE item_id IN (SELECT id FROM items WHERE current_status = 'OUT')")
-        
-        # 3. Delete scan history for OUT items
-        c.execute("DELETE FROM item_scans WHERE barcode IN (SELECT full_barcode FROM items WHERE current_status = 'OUT')")
-        
-        # 4. Finally delete the OUT items themselves
-        c.execute("DELETE FROM items WHERE current_status = 'OUT'")
-        
-        conn.commit()
+        with transaction(conn):
+            # Notes and location history follow via ON DELETE CASCADE, scans via trg_scan_cascade
+            c.execute("DELETE FROM items WHERE current_status = 'OUT'")
+            out_count = c.rowcount
+
         print(f"Deleted {out_count} OUT items and all their associated data.")
     except Exception as e:
-        conn.rollback()
         print(f"Error deleting OUT items: {e}")
-    finally:
-        conn.close()
+
+def detailed_report_session():
+    """Ask for report filters and show the detailed report"""
+    print("\nFilter options (leave blank for all):")
+    i_type = input("Item type: ").strip()
+    gen = input("Generation: ").strip()
+    loc = input("Location barcode: ").strip()
+    date_filter = input("Created date (DD.MM.YYYY): ").strip()
+    generate_detailed_report(
+        i_type if i_type else None,
+        gen if gen else None,
+        loc if loc else None,
+        date_filter if date_filter else None
+    )
+
+def show_cache_stats():
+    """Print hit/miss counts of the lookup caches (hidden debug option)"""
+    for label, cached in (("Barcode parse", _parse_barcode_cached),
+                          ("Item names", _lookup_item_name),
+                          ("Location names", _lookup_location_name)):
+        info = cached.cache_info()
+        total = info.hits + info.misses
+        ratio = info.hits / total * 100 if total else 0.0
+        print(f"{label:<15} hits={info.hits} misses={info.misses} size={info.currsize}/{info.maxsize} ({ratio:.1f}% hits)")
+
+# Location management menu text and choices ("4" goes back and is handled in manage_locations)
+LOCATION_MENU_BANNER = "\n".join([
+    "\n" + "="*30,
+    "LOCATION MANAGEMENT",
+    "="*30,
+    "1: Register new location",
+    "2: List all locations",
+    "3: Remove a location",
+    "4: Back to main menu",
+])
+
+LOCATION_MENU = {
+    "1": register_location_session,
+    "2": list_locations,
+    "3": remove_location,
+}
+
+# Item code management menu text and choices ("4" goes back and is handled in manage_item_codes)
+ITEM_CODE_MENU_BANNER = "\n".join([
+    "\n" + "="*30,
+    "ITEM CODE MANAGEMENT",
+    "="*30,
+    "1: List all item codes",
+    "2: Add/Update item code",
+    "3: Remove item code",
+    "4: Back to main menu",
+])
+
+ITEM_CODE_MENU = {
+    "1": list_item_codes,
+    "2": add_or_update_item_code,
+    "3": remove_item_code,
+}
+
+# Main menu text, built once
+MAIN_MENU_BANNER = "\n".join([
+    "\n" + "="*30,
+    "ITEM TRACKING SYSTEM",
+    "="*30,
+    "1: Check in / Move items",
+    "2: Check out items (OUT)",
+    "3: Manage item codes",
+    "4: Manage locations",
+    "5: Show detailed report",
+    "6: Add/edit note",
+    "7: Create new batch",
+    "8: Delete all OUT items",
+    "9: Exit",
+])
+
+# Main menu choices ("9" exits and is handled in main)
+MAIN_MENU = {
+    "1": move_item_session,
+    "2": checkout_session,
+    "3": manage_item_codes,
+    "4": manage_locations,
+    "5": detailed_report_session,
+    "6": add_notes_session,  # ===== TASK 2: UPDATED NOTE FUNCTION =====
+    "7": create_batch,
+    "8": delete_all_out_items,
+    "cache": show_cache_stats,  # Hidden debug option, not listed in the banner
+}
 
 def main():
+    setup_history()
     init_database()
+    start_checkpointer()
+    start_writer()
     # ===== TASK 1: BACKUP ON START =====
     backup_database()
     
     while True:
-        print("\n" + "="*30)
-        print("ITEM TRACKING SYSTEM")
-        print("="*30)
-        print("1: Check in / Move items")
-        print("2: Check out items (OUT)")
-        print("3: Manage item codes")
-        print("4: Manage locations")
-        print("5: Show detailed report")
-        print("6: Add/edit note")
-        print("7: Create new batch")
-        print("8: Delete all OUT items")
-        print("9: Exit")
+        print(MAIN_MENU_BANNER)
         
         choice = input("Select: ")
         
-        if choice == "1":
-            move_item_session()
-        elif choice == "2":
-            # For OUT, we don't need location
-            print("\nCHECK OUT MODE - Scan items (type 'finish' to exit)")
-            print("Scan/type 'finish' to return to menu")
-            while True:
-                barcode = input("\nScan item barcode (or 'finish' to exit): ").strip()
-                
-                if barcode.lower() == "finish":
-                    break
-                    
-                # Parse as individual barcode (6 parts)
-                parsed = parse_barcode(barcode)
-                if not parsed:
-                    print("Invalid barcode! Expected format: XXXX_DD_MM_YY_GX_XXXX")
-                    continue
-                
-                # Ensure item exists in database
-                if not ensure_item_exists(
-                    barcode, 
-                    parsed['item_type'], 
-                    parsed['generation'], 
-                    parsed['created_date']
-                ):
-                    print("Failed to ensure item exists in database")
-                    continue
-                
-                # Update item status to OUT
-                if update_item_status(barcode, 'OUT'):
-                    print("Item status updated to OUT")
-                
-                # Log the scan
-                if log_scan(parsed, 'OUT'):
-                    show_last_scan(parsed, 'OUT')
-                    generate_inventory_report()
-                else:
-                    print("Error saving scan!")
-        elif choice == "3":
-            manage_item_codes()
-        elif choice == "4":
-            manage_locations()
-        elif choice == "5":
-            print("\nFilter options (leave blank for all):")
-            i_type = input("Item type: ").strip()
-            gen = input("Generation: ").strip()
-            loc = input("Location barcode: ").strip()
-            date_filter = input("Created date (DD.MM.YYYY): ").strip()
-            generate_detailed_report(
-                i_type if i_type else None,
-                gen if gen else None,
-                loc if loc else None,
-                date_filter if date_filter else None
-            )
-        elif choice == "6":
-            # ===== TASK 2: UPDATED NOTE FUNCTION =====
-            add_notes_session()
-        elif choice == "7":
-            create_batch()
-        elif choice == "8":
-            delete_all_out_items()
-        elif choice == "9":
+        if choice == "9":
             print("Exiting system...")
+            close_conn()
             break
+        
+        handler = MAIN_MENU.get(choice)
+        if handler:
+            handler()
         else:
             print("Invalid selection!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()